@@ -8,6 +8,7 @@ from utils import (
     setup_logger,
     SheetsHandler
 )
+from utils.gmail_handler import CACHE_FILE
 from dotenv import load_dotenv
 import logging
 from datetime import datetime
@@ -495,10 +496,20 @@ def sign_out():
                 {'timestamp': datetime.now(ist).isoformat()}
             )
         
-        # Remove token file
+        # Remove the token file and the in-process credential cache
+        if os.path.exists('token.json'):
+            os.remove('token.json')
+        # Upgrading installs may still carry a live refresh token in the
+        # legacy pickle file; sign-out must not leave it behind
         if os.path.exists('token.pickle'):
             os.remove('token.pickle')
-        
+        GmailHandler._CREDS = None
+
+        # The message cache holds email bodies and password hints; it
+        # belongs to the signed-in account, so it goes with the token
+        if os.path.exists(CACHE_FILE):
+            os.remove(CACHE_FILE)
+
         # Clear session state
         for key in list(st.session_state.keys()):
             del st.session_state[key]
@@ -1170,11 +1181,14 @@ def main():
                                                 file_data = st.session_state.drive_handler.download_file(pdf['id'])
                                                 if file_data:
                                                     # Extract transactions
+                                                    # Only transactions are needed here; skip
+                                                    # re-serializing an unencrypted copy
                                                     _, _, _, transactions = st.session_state.pdf_handler.process_pdf(
                                                         file_data,
                                                         folder_name,
                                                         None,
-                                                        None
+                                                        None,
+                                                        produce_unencrypted=False
                                                     )
                                                     
                                                     # Write transactions to sheet
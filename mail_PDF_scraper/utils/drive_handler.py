@@ -1,14 +1,19 @@
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
-from typing import Optional
+from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload
+from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import io
 import logging
+import time
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+from .google_api import get_service, get_thread_service, execute_with_retry
+
+# Get module logger
 logger = logging.getLogger(__name__)
 
+# How long a folder-name lookup stays valid (seconds)
+FOLDER_CACHE_TTL = 300
+
 class DriveHandler:
     def __init__(self, credentials: Credentials):
         """
@@ -16,7 +21,9 @@ class DriveHandler:
         Args:
             credentials: Google OAuth2 credentials
         """
-        self.service = build('drive', 'v3', credentials=credentials)
+        self.service = get_service('drive', 'v3', credentials)
+        self._credentials = credentials
+        self._folder_cache = {}  # folder_name -> (folder_id, cached_at)
 
     def create_folder(self, folder_name: str, parent_folder_id: str = None) -> str:
         """
@@ -37,15 +44,15 @@ class DriveHandler:
             if parent_folder_id:
                 file_metadata['parents'] = [parent_folder_id]
             
-            folder = self.service.files().create(
+            folder = execute_with_retry(self.service.files().create(
                 body=file_metadata,
                 fields='id'
-            ).execute()
+            ))
             
             return folder.get('id')
             
         except Exception as e:
-            logger.error(f"Error creating folder: {str(e)}")
+            logger.error("Error creating folder: %s", e)
             return None
 
     def upload_file(self, file_data: bytes, filename: str, folder_id: Optional[str] = None) -> bool:
@@ -69,17 +76,91 @@ class DriveHandler:
                 resumable=True
             )
 
-            self.service.files().create(
+            execute_with_retry(self.service.files().create(
                 body=file_metadata,
                 media_body=media,
                 fields='id'
-            ).execute()
+            ))
 
             return True
         except Exception as e:
-            logger.error(f"Error uploading file: {str(e)}")
+            logger.error("Error uploading file: %s", e)
             return False
 
+    def upload_many(self, items: List[Tuple[bytes, str]], folder_id: Optional[str] = None,
+                    workers: int = 6) -> List[bool]:
+        """
+        Upload multiple files to Google Drive in parallel
+        Args:
+            items: List of (file content, filename) tuples
+            folder_id: Optional folder ID to upload to
+            workers: Number of concurrent upload threads
+        Returns:
+            List of per-item success flags, in the order items were given
+        """
+        if not items:
+            return []
+
+        results = [False] * len(items)
+
+        def _upload(index: int) -> None:
+            file_data, filename = items[index]
+            try:
+                file_metadata = {'name': filename}
+                if folder_id:
+                    file_metadata['parents'] = [folder_id]
+
+                media = MediaIoBaseUpload(
+                    io.BytesIO(file_data),
+                    mimetype='application/pdf',
+                    resumable=True
+                )
+
+                # Each worker thread needs its own service object
+                service = get_thread_service('drive', 'v3', self._credentials)
+                execute_with_retry(service.files().create(
+                    body=file_metadata,
+                    media_body=media,
+                    fields='id'
+                ))
+                results[index] = True
+            except Exception as e:
+                logger.error("Error uploading file %s: %s", filename, e)
+
+        # Start the largest uploads first so a big file doesn't serialize the tail
+        order = sorted(range(len(items)), key=lambda i: len(items[i][0]), reverse=True)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(_upload, order))
+
+        return results
+
+    def download_file(self, file_id: str, size_hint: int = 0) -> Optional[bytes]:
+        """
+        Download a file's content from Google Drive
+        Args:
+            file_id: ID of the file to download
+            size_hint: Expected file size in bytes, used to preallocate the
+                download buffer (0 to grow on demand)
+        Returns:
+            File content in bytes if successful, None otherwise
+        """
+        try:
+            request = self.service.files().get_media(fileId=file_id)
+            # Preallocate when the caller knows the size, so chunk writes
+            # overwrite in place instead of repeatedly growing the buffer
+            buffer = io.BytesIO(bytes(size_hint)) if size_hint else io.BytesIO()
+            # Stream in 1 MiB chunks instead of buffering the whole response
+            downloader = MediaIoBaseDownload(buffer, request, chunksize=1 << 20)
+            done = False
+            while not done:
+                _, done = downloader.next_chunk()
+            # Drop any preallocated tail beyond what was actually written
+            buffer.truncate()
+            return buffer.getvalue()
+        except Exception as e:
+            logger.error("Error downloading file %s: %s", file_id, e)
+            return None
+
     def check_folder_exists(self, folder_name: str) -> Optional[str]:
         """
         Check if a folder exists in Google Drive
@@ -89,15 +170,25 @@ class DriveHandler:
             Folder ID if exists, None otherwise
         """
         try:
-            query = f"mimeType='application/vnd.google-apps.folder' and name='{folder_name}' and trashed=false"
-            results = self.service.files().list(
+            cached = self._folder_cache.get(folder_name)
+            if cached and time.time() - cached[1] < FOLDER_CACHE_TTL:
+                return cached[0]
+
+            # Escape backslashes and quotes so the name is matched exactly
+            escaped = folder_name.replace("\\", "\\\\").replace("'", "\\'")
+            query = f"mimeType='application/vnd.google-apps.folder' and name='{escaped}' and trashed=false"
+            results = execute_with_retry(self.service.files().list(
                 q=query,
                 spaces='drive',
-                fields='files(id, name)'
-            ).execute()
+                fields='files(id)',
+                pageSize=1
+            ))
 
             files = results.get('files', [])
-            return files[0]['id'] if files else None
+            folder_id = files[0]['id'] if files else None
+            if folder_id:
+                self._folder_cache[folder_name] = (folder_id, time.time())
+            return folder_id
         except Exception as e:
-            logger.error(f"Error checking folder: {str(e)}")
+            logger.error("Error checking folder: %s", e)
             return None 
\ No newline at end of file
@@ -6,8 +6,7 @@ import os
 from typing import Tuple, Optional
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Get module logger
 logger = logging.getLogger(__name__)
 
 class Encryptor:
@@ -1,15 +1,21 @@
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+import asyncio
 import base64
+from concurrent.futures import ThreadPoolExecutor
+import json
 import os.path
-import pickle
-from typing import List, Dict, Any
+import sqlite3
+import threading
+from functools import lru_cache
+from itertools import islice
+from typing import List, Dict, Any, Iterator, Optional
 import logging
 from datetime import datetime
 import re
 
+from .google_api import get_service, get_thread_service, execute_with_retry
+
 # Get module logger
 logger = logging.getLogger(__name__)
 
@@ -19,12 +25,192 @@ SCOPES = [
     'https://www.googleapis.com/auth/drive.file'  # For file uploads
 ]
 
+# Common patterns for password hints in email bodies, compiled once
+_HINT_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r'password[:\s]+([^\n]+)',
+    r'passcode[:\s]+([^\n]+)',
+    r'pin[:\s]+([^\n]+)',
+    r'key[:\s]+([^\n]+)',
+    r'password is[:\s]+([^\n]+)',
+    r'pin is[:\s]+([^\n]+)',
+    r'passcode is[:\s]+([^\n]+)',
+    r'dob[:\s]+([^\n]+)',
+    r'date of birth[:\s]+([^\n]+)',
+    r'last \d digits[:\s]+([^\n]+)',
+    r'last four digits[:\s]+([^\n]+)',
+    r'password format[:\s]+([^\n]+)',
+    r'format[:\s]+([^\n]+).*?(?:for password|as password)',
+)]
+
+# Token storage file
+TOKEN_FILE = 'token.json'
+
+# On-disk cache of built message records; Gmail messages are immutable once
+# delivered, so entries never need invalidating
+CACHE_FILE = '.gmail_cache.sqlite'
+
+# Sub-requests per batch HTTP request (Gmail's documented limit is 100)
+BATCH_SIZE = 100
+
+# PDF filename suffix match, case-insensitive without lowering the whole name
+_PDF_RE = re.compile(r'\.pdf\Z', re.IGNORECASE)
+
+# Fields kept per MIME part: enough for attachment collection and the
+# text/plain password-hint scan, nothing else
+_PART_FIELDS = 'filename,mimeType,body(attachmentId,size,data)'
+
+# Partial-response mask for messages().get(); keeps headers and a MIME tree
+# trimmed to _PART_FIELDS while dropping snippet, labelIds, sizeEstimate and
+# other fields the code never reads. Parts are selected three levels deep
+# (typical multipart nesting), with full sub-parts kept past that as a
+# fallback for unusually deep trees
+MESSAGE_FIELDS = (
+    'id,internalDate,payload(headers,'
+    f'parts({_PART_FIELDS},parts({_PART_FIELDS},parts({_PART_FIELDS},parts))))'
+)
+
+# Partial-response mask for messages().list(); only the IDs and the paging
+# token are read, so resultSizeEstimate and threadId can be dropped
+LIST_FIELDS = 'messages/id,nextPageToken'
+
 class GmailHandler:
+    # Credentials shared across handler instances in the same process, so
+    # repeated authenticate() calls don't re-read the token from disk
+    _CREDS: Optional[Credentials] = None
+    # Background refresh timer shared across instances, guarded by a lock so
+    # a proactive refresh never races a lazy one in authenticate()
+    _REFRESH_TIMER: Optional[threading.Timer] = None
+    _REFRESH_LOCK = threading.Lock()
+
     def __init__(self):
         self.creds = None
         self.service = None
+        self._cache = None
+        self._cache_lock = threading.Lock()
+        self._prefetch_pool = None
         logger.info("Gmail handler initialized")
 
+    def _cache_conn(self) -> sqlite3.Connection:
+        """Open the message record cache on first use"""
+        if self._cache is None:
+            is_new_file = not os.path.exists(CACHE_FILE)
+            self._cache = sqlite3.connect(CACHE_FILE, check_same_thread=False)
+            self._cache.execute(
+                'CREATE TABLE IF NOT EXISTS messages (id TEXT PRIMARY KEY, record TEXT)'
+            )
+            # Cached records carry email bodies and password hints; keep
+            # the file owner-only like token.json and the audit logs
+            if is_new_file:
+                os.chmod(CACHE_FILE, 0o600)
+        return self._cache
+
+    def _cache_get_many(self, message_ids: List[str]) -> Dict[str, Any]:
+        """
+        Look up cached records for the given message IDs
+        Args:
+            message_ids: Message IDs to look up
+        Returns:
+            Dict mapping message ID to its cached record (None for messages
+            already known to carry no PDF attachments)
+        """
+        if not message_ids:
+            return {}
+        try:
+            with self._cache_lock:
+                placeholders = ','.join('?' * len(message_ids))
+                rows = self._cache_conn().execute(
+                    f'SELECT id, record FROM messages WHERE id IN ({placeholders})',
+                    message_ids
+                ).fetchall()
+            return {row_id: json.loads(record) for row_id, record in rows}
+        except Exception as e:
+            logger.warning("Message cache read failed: %s", e)
+            return {}
+
+    def _cache_put(self, message_id: str, record: Optional[Dict[str, Any]]) -> None:
+        """Store a built record (or a no-PDF marker) for a message ID"""
+        try:
+            if record:
+                # match_type depends on the query, not the message; don't
+                # persist it with the immutable record
+                record = {k: v for k, v in record.items() if k != 'match_type'}
+            with self._cache_lock:
+                conn = self._cache_conn()
+                conn.execute(
+                    'INSERT OR REPLACE INTO messages (id, record) VALUES (?, ?)',
+                    (message_id, json.dumps(record))
+                )
+                conn.commit()
+        except Exception as e:
+            logger.warning("Message cache write failed: %s", e)
+
+    def _load_token(self) -> Optional[Credentials]:
+        """Load saved credentials from the JSON token file"""
+        try:
+            if os.path.exists(TOKEN_FILE):
+                logger.info("Found existing token.json file")
+                return Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+        except Exception as e:
+            logger.warning("Could not load saved credentials: %s", e)
+        return None
+
+    def _save_token(self, creds: Credentials) -> None:
+        """Persist credentials as JSON with owner-only permissions"""
+        try:
+            with open(TOKEN_FILE, 'w') as token:
+                token.write(creds.to_json())
+            os.chmod(TOKEN_FILE, 0o600)
+            logger.info("Credentials saved to token.json")
+        except Exception as e:
+            logger.warning("Could not save credentials: %s", e)
+
+    def _schedule_refresh(self) -> None:
+        """Arm a timer that refreshes the token shortly before it expires"""
+        creds = GmailHandler._CREDS
+        if not creds or not creds.expiry or not creds.refresh_token:
+            return
+        delay = (creds.expiry - datetime.utcnow()).total_seconds() - 60
+        with GmailHandler._REFRESH_LOCK:
+            if GmailHandler._REFRESH_TIMER:
+                GmailHandler._REFRESH_TIMER.cancel()
+            timer = threading.Timer(max(delay, 1), self._refresh_in_background)
+            timer.daemon = True
+            timer.start()
+            GmailHandler._REFRESH_TIMER = timer
+
+    def _ensure_fresh_token(self, margin_s: int = 300) -> None:
+        """
+        Refresh credentials now if they expire within the given margin, so a
+        long batch doesn't cross the expiry and collapse into 401 retries
+        Args:
+            margin_s: Minimum remaining token lifetime in seconds
+        """
+        creds = self.creds
+        if not creds or not creds.expiry or not creds.refresh_token:
+            return
+        try:
+            with GmailHandler._REFRESH_LOCK:
+                if (creds.expiry - datetime.utcnow()).total_seconds() < margin_s:
+                    creds.refresh(Request())
+                    self._save_token(creds)
+        except Exception as e:
+            logger.warning("Pre-emptive token refresh failed: %s", e)
+
+    def _refresh_in_background(self) -> None:
+        """Refresh the shared credentials off the request path, then re-arm"""
+        creds = GmailHandler._CREDS
+        if not creds or not creds.refresh_token:
+            return
+        try:
+            with GmailHandler._REFRESH_LOCK:
+                creds.refresh(Request())
+            self._save_token(creds)
+            logger.info("Credentials refreshed in background")
+        except Exception as e:
+            logger.warning("Background credential refresh failed: %s", e)
+            return
+        self._schedule_refresh()
+
     def authenticate(self) -> bool:
         """
         Handles Gmail authentication using OAuth2
@@ -32,8 +218,12 @@ class GmailHandler:
             bool: True if authentication successful, False otherwise
         """
         try:
+            # Already authenticated with usable credentials; nothing to do
+            if self.creds and self.creds.valid and self.service:
+                return True
+
             logger.info("Starting authentication process")
-            
+
             if not os.path.exists('credentials.json'):
                 logger.error("credentials.json not found in project root directory")
                 raise FileNotFoundError(
@@ -41,29 +231,36 @@ class GmailHandler:
                     "to create and download your Google Cloud credentials."
                 )
 
-            if os.path.exists('token.pickle'):
-                logger.info("Found existing token.pickle file")
-                with open('token.pickle', 'rb') as token:
-                    self.creds = pickle.load(token)
+            # Reuse credentials already loaded in this process before
+            # falling back to the token file
+            if not self.creds:
+                self.creds = GmailHandler._CREDS
+            if not self.creds:
+                self.creds = self._load_token()
 
             if not self.creds or not self.creds.valid:
                 if self.creds and self.creds.expired and self.creds.refresh_token:
                     logger.info("Refreshing expired credentials")
                     try:
                         self.creds.refresh(Request())
+                        self._save_token(self.creds)
                         logger.info("Credentials refreshed successfully")
                     except Exception as e:
-                        logger.error(f"Error refreshing credentials: {str(e)}")
+                        logger.error("Error refreshing credentials: %s", e)
                         self.creds = None
-                
+
                 if not self.creds:
                     logger.info("Starting OAuth flow")
                     try:
+                        # Imported here so the oauthlib stack is only paid
+                        # for on the rare first-auth path
+                        from google_auth_oauthlib.flow import InstalledAppFlow
+
                         flow = InstalledAppFlow.from_client_secrets_file(
-                            'credentials.json', 
+                            'credentials.json',
                             SCOPES
                         )
-                        
+
                         # Simple local server with minimal HTML
                         self.creds = flow.run_local_server(
                             port=0,  # Let the OS choose an available port
@@ -71,32 +268,22 @@ class GmailHandler:
                             success_message='Authentication successful! You may close this window.',
                             open_browser=True
                         )
-                        
+
                         logger.info("OAuth flow completed successfully")
-                        
+
                         # Save credentials immediately
-                        try:
-                            logger.info("Saving credentials to token.pickle")
-                            with open('token.pickle', 'wb') as token:
-                                pickle.dump(self.creds, token)
-                            os.chmod('token.pickle', 0o600)
-                            logger.info("Credentials saved successfully")
-                        except Exception as e:
-                            logger.warning(f"Could not save credentials: {str(e)}")
-                        
-                        # Initialize service immediately
-                        self.service = build('gmail', 'v1', credentials=self.creds)
-                        logger.info("Gmail service initialized successfully")
-                        return True
-                        
+                        self._save_token(self.creds)
+
                     except Exception as e:
-                        logger.error(f"Error in OAuth flow: {str(e)}")
+                        logger.error("Error in OAuth flow: %s", e)
                         raise RuntimeError(
                             "Authentication failed. Please ensure you have enabled the Gmail API "
                             "and configured the OAuth consent screen in Google Cloud Console."
                         )
 
-            self.service = build('gmail', 'v1', credentials=self.creds)
+            GmailHandler._CREDS = self.creds
+            self.service = get_service('gmail', 'v1', self.creds)
+            self._schedule_refresh()
             logger.info("Gmail service initialized successfully")
             return True
 
@@ -104,7 +291,7 @@ class GmailHandler:
             logger.error(str(e))
             raise
         except Exception as e:
-            logger.error(f"Authentication failed: {str(e)}")
+            logger.error("Authentication failed: %s", e)
             return False
 
     def search_emails(self, keywords: List[str], max_results: int = None) -> List[Dict[str, Any]]:
@@ -117,229 +304,348 @@ class GmailHandler:
             List of dictionaries containing email details and match type
         """
         try:
-            if not self.service:
-                raise RuntimeError("Gmail service not initialized. Please authenticate first.")
-
-            # Construct search query for exact matches
-            exact_query = ' OR '.join(f'(subject:"{keyword}")' for keyword in keywords)
-            exact_query += ' has:attachment filename:pdf'
-            
-            # Construct search query for content matches
-            content_query = ' OR '.join(f'"{keyword}"' for keyword in keywords)
-            content_query += ' -(' + exact_query + ') has:attachment filename:pdf'  # Exclude exact matches
-
-            results = []
-            
-            # Search for exact matches
-            exact_results = self.service.users().messages().list(
-                userId='me',
-                q=exact_query,
-                maxResults=max_results
-            ).execute()
-            
-            exact_messages = exact_results.get('messages', [])
-            
-            # Search for content matches
-            content_results = self.service.users().messages().list(
-                userId='me',
-                q=content_query,
-                maxResults=max_results
-            ).execute()
-
-            content_messages = content_results.get('messages', [])
+            return list(islice(self.iter_emails(keywords), max_results))
+        except Exception as e:
+            logger.error("Error searching emails: %s", e)
+            return []
 
-            # Process exact matches
-            for message in exact_messages:
+    def iter_emails(self, keywords: List[str],
+                    prefetch: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Yield matching emails one at a time, paging the search lazily
+        Args:
+            keywords: List of search keywords
+            prefetch: Start downloading each email's attachments in the
+                background; attachments gain a 'data_future' whose result()
+                is the file bytes
+        Yields:
+            Dictionaries containing email details and match type
+        """
+        pair_iter = self._iter_message_ids(keywords)
+        while True:
+            # Materialize one batch worth of IDs at a time so callers that
+            # stop early never pay for the remaining pages
+            pairs = list(islice(pair_iter, BATCH_SIZE))
+            if not pairs:
+                return
+            # Messages are immutable, so anything cached from an earlier run
+            # skips the network entirely; only fetch the misses
+            cached = self._cache_get_many([message_id for message_id, _ in pairs])
+            fetched = self._fetch_messages(
+                [message_id for message_id, _ in pairs if message_id not in cached]
+            )
+            for message_id, match_type in pairs:
+                if message_id in cached:
+                    email = cached[message_id]
+                    if email:
+                        email['match_type'] = match_type
+                        if prefetch:
+                            self._prefetch_attachments(email)
+                        yield email
+                    continue
+                email_data = fetched.get(message_id)
+                if not email_data:
+                    continue
                 try:
-                    email_data = self.service.users().messages().get(
-                        userId='me',
-                        id=message['id'],
-                        format='full'
-                    ).execute()
-
-                    attachments = []
-                    subject = ''
-                    sender = ''
-                    sender_email = ''
-                    password_hint = ''
-                    email_body = ''
-
-                    # Get email headers
-                    for header in email_data['payload']['headers']:
-                        if header['name'] == 'Subject':
-                            subject = header['value']
-                        elif header['name'] == 'From':
-                            sender = header['value']
-                            # Extract email from sender
-                            match = re.search(r'<(.+?)>', sender)
-                            if match:
-                                sender_email = match.group(1)
-                            else:
-                                sender_email = sender
-
-                    # Get email body and look for password hints
-                    if 'parts' in email_data['payload']:
-                        for part in email_data['payload']['parts']:
-                            if part.get('mimeType') == 'text/plain':
-                                try:
-                                    body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-                                    email_body = body  # Store the entire email body
-                                    # Look for common password hints
-                                    hint_patterns = [
-                                        r'password[:\s]+([^\n]+)',
-                                        r'passcode[:\s]+([^\n]+)',
-                                        r'pin[:\s]+([^\n]+)',
-                                        r'key[:\s]+([^\n]+)',
-                                        r'password is[:\s]+([^\n]+)',
-                                        r'pin is[:\s]+([^\n]+)',
-                                        r'passcode is[:\s]+([^\n]+)',
-                                        r'dob[:\s]+([^\n]+)',
-                                        r'date of birth[:\s]+([^\n]+)',
-                                        r'last \d digits[:\s]+([^\n]+)',
-                                        r'last four digits[:\s]+([^\n]+)',
-                                        r'password format[:\s]+([^\n]+)',
-                                        r'format[:\s]+([^\n]+).*?(?:for password|as password)',
-                                    ]
-                                    for pattern in hint_patterns:
-                                        match = re.search(pattern, body, re.IGNORECASE)
-                                        if match:
-                                            password_hint = match.group(1).strip()
-                                            break
-                                except Exception as e:
-                                    logger.error(f"Error processing email body: {str(e)}")
-                                    continue
-
-                    # Get attachments
-                    if 'parts' in email_data['payload']:
-                        attachments = self._process_parts(email_data['payload']['parts'], message['id'])
-
-                    if attachments:
-                        results.append({
-                            'id': message['id'],
-                            'subject': subject,
-                            'sender': sender,
-                            'sender_email': sender_email,
-                            'date': email_data['internalDate'],
-                            'attachments': attachments,
-                            'match_type': 'exact',
-                            'password_hint': password_hint,
-                            'email_body': email_body  # Include email body in results
-                        })
-
+                    email = self._build_record(email_data, message_id, match_type)
+                    self._cache_put(message_id, email)
+                    if email:
+                        if prefetch:
+                            self._prefetch_attachments(email)
+                        yield email
                 except Exception as e:
-                    logger.error(f"Error processing message {message['id']}: {str(e)}")
+                    logger.error("Error processing message %s: %s", message_id, e)
                     continue
 
-            # Process content matches
-            for message in content_messages:
-                try:
-                    email_data = self.service.users().messages().get(
+    def _prefetch_attachments(self, email: Dict[str, Any]) -> None:
+        """Kick off background downloads for an email's attachments"""
+        if self._prefetch_pool is None:
+            self._prefetch_pool = ThreadPoolExecutor(max_workers=6)
+        for attachment in email['attachments']:
+            attachment['data_future'] = self._prefetch_pool.submit(
+                self._download_one, attachment['message_id'], attachment['id']
+            )
+
+    def _fetch_messages(self, message_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch messages over the batch endpoint, BATCH_SIZE per HTTP request
+        Args:
+            message_ids: Message IDs to fetch
+        Returns:
+            Dict mapping message ID to the message resource
+        """
+        fetched = {}
+        self._ensure_fresh_token()
+
+        def _on_message(request_id, response, exception):
+            if exception is not None:
+                logger.error("Error fetching message %s: %s", request_id, exception)
+            else:
+                fetched[request_id] = response
+
+        for start in range(0, len(message_ids), BATCH_SIZE):
+            chunk = message_ids[start:start + BATCH_SIZE]
+            batch = self.service.new_batch_http_request(callback=_on_message)
+            for message_id in chunk:
+                batch.add(
+                    self.service.users().messages().get(
                         userId='me',
-                        id=message['id'],
-                        format='full'
-                    ).execute()
-
-                    attachments = []
-                    subject = ''
-                    sender = ''
-                    sender_email = ''
-                    password_hint = ''
-                    email_body = ''
-
-                    # Get email headers
-                    for header in email_data['payload']['headers']:
-                        if header['name'] == 'Subject':
-                            subject = header['value']
-                        elif header['name'] == 'From':
-                            sender = header['value']
-                            # Extract email from sender
-                            match = re.search(r'<(.+?)>', sender)
-                            if match:
-                                sender_email = match.group(1)
-                            else:
-                                sender_email = sender
-
-                    # Get email body and look for password hints
-                    if 'parts' in email_data['payload']:
-                        for part in email_data['payload']['parts']:
-                            if part.get('mimeType') == 'text/plain':
-                                try:
-                                    body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-                                    email_body = body  # Store the entire email body
-                                    # Look for common password hints
-                                    hint_patterns = [
-                                        r'password[:\s]+([^\n]+)',
-                                        r'passcode[:\s]+([^\n]+)',
-                                        r'pin[:\s]+([^\n]+)',
-                                        r'key[:\s]+([^\n]+)',
-                                        r'password is[:\s]+([^\n]+)',
-                                        r'pin is[:\s]+([^\n]+)',
-                                        r'passcode is[:\s]+([^\n]+)',
-                                        r'dob[:\s]+([^\n]+)',
-                                        r'date of birth[:\s]+([^\n]+)',
-                                        r'last \d digits[:\s]+([^\n]+)',
-                                        r'last four digits[:\s]+([^\n]+)',
-                                        r'password format[:\s]+([^\n]+)',
-                                        r'format[:\s]+([^\n]+).*?(?:for password|as password)',
-                                    ]
-                                    for pattern in hint_patterns:
-                                        match = re.search(pattern, body, re.IGNORECASE)
-                                        if match:
-                                            password_hint = match.group(1).strip()
-                                            break
-                                except Exception as e:
-                                    logger.error(f"Error processing email body: {str(e)}")
-                                    continue
-
-                    # Get attachments
-                    if 'parts' in email_data['payload']:
-                        attachments = self._process_parts(email_data['payload']['parts'], message['id'])
-
-                    if attachments:
-                        results.append({
-                            'id': message['id'],
-                            'subject': subject,
-                            'sender': sender,
-                            'sender_email': sender_email,
-                            'date': email_data['internalDate'],
-                            'attachments': attachments,
-                            'match_type': 'content',
-                            'password_hint': password_hint,
-                            'email_body': email_body  # Include email body in results
-                        })
+                        id=message_id,
+                        format='full',
+                        fields=MESSAGE_FIELDS
+                    ),
+                    request_id=message_id
+                )
+            try:
+                execute_with_retry(batch)
+            except Exception as e:
+                # Batch endpoint unavailable or rejected outright; fall back
+                # to overlapping individual gets
+                logger.warning("Batch fetch failed (%s), falling back to threaded gets", e)
+                remaining = [m for m in chunk if m not in fetched]
+                with ThreadPoolExecutor(max_workers=10) as executor:
+                    for message_id, response in zip(
+                            remaining, executor.map(self._fetch_one, remaining)):
+                        if response:
+                            fetched[message_id] = response
+
+        return fetched
+
+    def _fetch_one(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch a single message with a per-thread service"""
+        try:
+            service = get_thread_service('gmail', 'v1', self.creds)
+            return execute_with_retry(service.users().messages().get(
+                userId='me',
+                id=message_id,
+                format='full',
+                fields=MESSAGE_FIELDS
+            ))
+        except Exception as e:
+            logger.error("Error fetching message %s: %s", message_id, e)
+            return None
 
-                except Exception as e:
-                    logger.error(f"Error processing message {message['id']}: {str(e)}")
-                    continue
+    async def search_emails_async(self, keywords: List[str], max_results: int = None,
+                                  concurrency: int = 8) -> List[Dict[str, Any]]:
+        """
+        Async variant of search_emails that materializes messages concurrently
+        Args:
+            keywords: List of search keywords
+            max_results: Maximum number of emails to retrieve (None for no limit)
+            concurrency: Maximum number of in-flight message fetches
+        Returns:
+            List of dictionaries containing email details and match type
+        """
+        try:
+            pairs = await asyncio.to_thread(self._list_message_ids, keywords, max_results)
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def _fetch(message_id, match_type):
+                async with semaphore:
+                    try:
+                        return await asyncio.to_thread(self._materialize, message_id, match_type)
+                    except Exception as e:
+                        logger.error("Error processing message %s: %s", message_id, e)
+                        return None
 
-            return results
+            emails = await asyncio.gather(
+                *[_fetch(message_id, match_type) for message_id, match_type in pairs]
+            )
+            return [email for email in emails if email]
 
         except Exception as e:
-            logger.error(f"Error searching emails: {str(e)}")
+            logger.error("Error searching emails: %s", e)
             return []
 
-    def _process_parts(self, parts: List[Dict[str, Any]], message_id: str) -> List[Dict[str, Any]]:
+    def _list_message_ids(self, keywords: List[str], max_results: int = None) -> List[tuple]:
         """
-        Process email parts to extract PDF attachments
+        Run the exact and content searches and return deduplicated message IDs
+        Args:
+            keywords: List of search keywords
+            max_results: Maximum number of message IDs to return (None for no limit)
+        Returns:
+            List of (message_id, match_type) tuples
+        """
+        return list(islice(self._iter_message_ids(keywords), max_results))
+
+    def _iter_message_ids(self, keywords: List[str]) -> Iterator[tuple]:
+        """
+        Yield deduplicated (message_id, match_type) pairs, paging server-side
+        Args:
+            keywords: List of search keywords
+        Yields:
+            (message_id, match_type) tuples, exact matches first
+        """
+        if not self.service:
+            raise RuntimeError("Gmail service not initialized. Please authenticate first.")
+
+        exact_query, content_query = self._build_queries(tuple(keywords))
+
+        # Drop content hits that already matched exactly; negating the
+        # exact query server-side isn't reliable and any overlap costs a
+        # full messages().get() per duplicate
+        seen_ids = set()
+
+        # A single worker runs the list calls so the next page is already in
+        # flight while the caller processes the current one
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            for query, match_type in ((exact_query, 'exact'), (content_query, 'content')):
+                future = executor.submit(self._list_page, query, None)
+                while future is not None:
+                    response = future.result()
+                    page_token = response.get('nextPageToken')
+                    future = (executor.submit(self._list_page, query, page_token)
+                              if page_token else None)
+                    for message in response.get('messages', []):
+                        if message['id'] in seen_ids:
+                            continue
+                        seen_ids.add(message['id'])
+                        yield message['id'], match_type
+
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def _build_queries(keywords: tuple) -> tuple:
+        """
+        Build the exact and content search queries for a keyword tuple
+        Args:
+            keywords: Search keywords as a hashable tuple
+        Returns:
+            Tuple of (exact_query, content_query)
+        """
+        exact_query = ' OR '.join(f'(subject:"{keyword}")' for keyword in keywords)
+        content_query = ' OR '.join(f'"{keyword}"' for keyword in keywords)
+        suffix = ' has:attachment filename:pdf'
+        return exact_query + suffix, content_query + suffix
+
+    def _list_page(self, query: str, page_token: Optional[str]) -> Dict[str, Any]:
+        """Fetch one page of message IDs on the worker thread's own service"""
+        service = get_thread_service('gmail', 'v1', self.creds)
+        return execute_with_retry(service.users().messages().list(
+            userId='me',
+            q=query,
+            maxResults=100,
+            pageToken=page_token,
+            fields=LIST_FIELDS
+        ))
+
+    def _materialize(self, message_id: str, match_type: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch a single message and build its result record
         Args:
-            parts: List of email parts
             message_id: Email message ID
+            match_type: 'exact' or 'content'
         Returns:
-            List of attachment details
+            Result dictionary, or None if the email has no PDF attachments
+        """
+        cached = self._cache_get_many([message_id])
+        if message_id in cached:
+            email = cached[message_id]
+            if email:
+                email['match_type'] = match_type
+            return email
+
+        # Use a per-thread service so concurrent fetches don't share the
+        # non-thread-safe httplib2 transport
+        service = get_thread_service('gmail', 'v1', self.creds)
+        email_data = execute_with_retry(service.users().messages().get(
+            userId='me',
+            id=message_id,
+            format='full',
+            fields=MESSAGE_FIELDS
+        ))
+        email = self._build_record(email_data, message_id, match_type)
+        self._cache_put(message_id, email)
+        return email
+
+    def _build_record(self, email_data: Dict[str, Any], message_id: str,
+                      match_type: str) -> Optional[Dict[str, Any]]:
+        """
+        Build a result record from a fetched message resource
+        Args:
+            email_data: Message resource returned by the API
+            message_id: Email message ID
+            match_type: 'exact' or 'content'
+        Returns:
+            Result dictionary, or None if the email has no PDF attachments
+        """
+        # Get email headers with a single pass over the list
+        headers = {h['name']: h['value'] for h in email_data['payload']['headers']}
+        subject = headers.get('Subject', '')
+        sender = headers.get('From', '')
+
+        # Extract email from sender
+        match = re.search(r'<(.+?)>', sender)
+        sender_email = match.group(1) if match else sender
+
+        # Collect attachments, email body and password hint in one pass
+        attachments, password_hint, email_body = self._walk_payload(
+            email_data['payload'], message_id
+        )
+
+        if not attachments:
+            return None
+
+        return {
+            'id': message_id,
+            'subject': subject,
+            'sender': sender,
+            'sender_email': sender_email,
+            'date': email_data['internalDate'],
+            'attachments': attachments,
+            'match_type': match_type,
+            'password_hint': password_hint,
+            'email_body': email_body  # Include email body in results
+        }
+
+    def _walk_payload(self, payload: Dict[str, Any], message_id: str) -> tuple:
+        """
+        Traverse the MIME tree once, collecting PDF attachments, the email
+        body and any password hint
+        Args:
+            payload: Message payload (root of the MIME tree)
+            message_id: Email message ID
+        Returns:
+            Tuple of (attachments, password_hint, email_body)
         """
         attachments = []
-        for part in parts:
-            if part.get('filename', '').lower().endswith('.pdf'):
-                attachment = {
-                    'id': part['body'].get('attachmentId'),
+        password_hint = ''
+        email_body = ''
+        seen_attachment_ids = set()
+
+        # Iterative depth-first traversal; deeply nested multipart messages
+        # would otherwise grow the Python call stack one frame per level
+        stack = list(payload.get('parts', ()))
+        while stack:
+            part = stack.pop()
+            if _PDF_RE.search(part.get('filename', '')):
+                attachment_id = part['body'].get('attachmentId')
+                # The same attachment can surface in multiple MIME branches
+                # (e.g. multipart/alternative); download it only once
+                if attachment_id in seen_attachment_ids:
+                    continue
+                seen_attachment_ids.add(attachment_id)
+                attachments.append({
+                    'id': attachment_id,
                     'filename': part['filename'],
                     'size': part['body'].get('size', 0),
                     'message_id': message_id
-                }
-                attachments.append(attachment)
-            if 'parts' in part:
-                attachments.extend(self._process_parts(part['parts'], message_id))
-        return attachments
+                })
+            elif (not email_body and part.get('mimeType') == 'text/plain'
+                  and part.get('body', {}).get('data')):
+                try:
+                    email_body = base64.urlsafe_b64decode(
+                        part['body']['data']
+                    ).decode('utf-8', errors='replace')
+                    for pattern in _HINT_PATTERNS:
+                        match = pattern.search(email_body)
+                        if match:
+                            password_hint = match.group(1).strip()
+                            break
+                except Exception as e:
+                    logger.error("Error processing email body: %s", e)
+            stack.extend(part.get('parts', ()))
+
+        return attachments, password_hint, email_body
 
     def download_attachment(self, message_id: str, attachment_id: str) -> bytes:
         """
@@ -354,14 +660,66 @@ class GmailHandler:
             if not self.service:
                 raise RuntimeError("Gmail service not initialized. Please authenticate first.")
 
-            attachment = self.service.users().messages().attachments().get(
+            attachment = execute_with_retry(self.service.users().messages().attachments().get(
                 userId='me',
                 messageId=message_id,
                 id=attachment_id
-            ).execute()
+            ))
+
+            # Decode the URL-safe alphabet in a single C call, without the
+            # intermediate bytes copy and translate pass urlsafe_b64decode does
+            return base64.b64decode(attachment['data'], altchars=b'-_')
+        except Exception as e:
+            logger.error("Error downloading attachment: %s", e)
+            return None
+
+    async def download_attachments_bulk(self, pairs: List[tuple],
+                                        concurrency: int = 16) -> List[Optional[bytes]]:
+        """
+        Download many attachments concurrently
+        Args:
+            pairs: List of (message_id, attachment_id) tuples
+            concurrency: Maximum number of downloads in flight at once
+        Returns:
+            List of attachment bytes (None for failures), in input order
+        """
+        self._ensure_fresh_token()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _bounded(message_id, attachment_id):
+            async with semaphore:
+                return await asyncio.to_thread(
+                    self._download_one, message_id, attachment_id
+                )
+
+        return list(await asyncio.gather(
+            *(_bounded(message_id, attachment_id)
+              for message_id, attachment_id in pairs)
+        ))
 
-            data = attachment['data']
-            return base64.urlsafe_b64decode(data.encode('UTF-8'))
+    def download_attachments(self, pairs: List[tuple],
+                             concurrency: int = 8) -> List[Optional[bytes]]:
+        """
+        Synchronous wrapper around download_attachments_bulk for callers
+        without an event loop
+        Args:
+            pairs: List of (message_id, attachment_id) tuples
+            concurrency: Maximum number of downloads in flight at once
+        Returns:
+            List of attachment bytes (None for failures), in input order
+        """
+        return asyncio.run(self.download_attachments_bulk(pairs, concurrency))
+
+    def _download_one(self, message_id: str, attachment_id: str) -> Optional[bytes]:
+        """Download one attachment on a worker thread's own service object"""
+        try:
+            service = get_thread_service('gmail', 'v1', self.creds)
+            attachment = execute_with_retry(service.users().messages().attachments().get(
+                userId='me',
+                messageId=message_id,
+                id=attachment_id
+            ))
+            return base64.b64decode(attachment['data'], altchars=b'-_')
         except Exception as e:
-            logger.error(f"Error downloading attachment: {str(e)}")
+            logger.error("Error downloading attachment %s: %s", attachment_id, e)
             return None 
\ No newline at end of file
@@ -0,0 +1,133 @@
+import logging
+import random
+import threading
+import time
+
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+# Get module logger
+logger = logging.getLogger(__name__)
+
+# Cache of discovery-built services keyed by (api, version, id(credentials)).
+# The credentials object is stored alongside the service so its id() cannot be
+# reused by a new object after garbage collection.
+_service_cache = {}
+_service_cache_lock = threading.Lock()
+
+
+def get_service(api: str, version: str, credentials):
+    """
+    Build a Google API service object, reusing a cached instance when possible
+    Args:
+        api: API name (e.g. 'drive', 'gmail')
+        version: API version (e.g. 'v3', 'v1')
+        credentials: Google OAuth2 credentials
+    Returns:
+        Discovery-built service object
+    """
+    key = (api, version, id(credentials))
+    with _service_cache_lock:
+        cached = _service_cache.get(key)
+        if cached is not None:
+            return cached[0]
+
+    service = build(
+        api,
+        version,
+        credentials=credentials,
+        cache_discovery=False,
+        static_discovery=True
+    )
+
+    with _service_cache_lock:
+        _service_cache[key] = (service, credentials)
+    return service
+
+
+# Per-thread service objects. The httplib2 transport inside a service is not
+# thread-safe, so worker threads must not share the process-wide cached one.
+_thread_local = threading.local()
+
+
+def get_thread_service(api: str, version: str, credentials):
+    """
+    Get a service object private to the calling thread
+    Args:
+        api: API name (e.g. 'drive', 'gmail')
+        version: API version (e.g. 'v3', 'v1')
+        credentials: Google OAuth2 credentials
+    Returns:
+        Discovery-built service object owned by the current thread
+    """
+    cache = getattr(_thread_local, 'services', None)
+    if cache is None:
+        cache = _thread_local.services = {}
+    key = (api, version, id(credentials))
+    cached = cache.get(key)
+    # As with _service_cache, pin the credentials in the value and verify
+    # identity: a collected object's id can be reused by a new one
+    if cached is not None and cached[1] is credentials:
+        return cached[0]
+    service = build(
+        api,
+        version,
+        credentials=credentials,
+        cache_discovery=False,
+        static_discovery=True
+    )
+    cache[key] = (service, credentials)
+    return service
+
+
+# HTTP statuses worth retrying with backoff
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+# 403 is retried only for these quota reasons
+RETRYABLE_403_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+
+def _is_retryable(error: HttpError) -> bool:
+    """Check whether an HttpError is a transient rate-limit/server error"""
+    status = error.resp.status
+    if status in RETRYABLE_STATUSES:
+        return True
+    if status == 403:
+        reason = ''
+        try:
+            reason = error._get_reason()
+        except Exception:
+            pass
+        return any(r in reason for r in RETRYABLE_403_REASONS)
+    return False
+
+
+def execute_with_retry(request, max_attempts: int = 6):
+    """
+    Execute an API request, retrying transient failures with backoff
+    Args:
+        request: Prepared API request (object with an execute() method)
+        max_attempts: Maximum number of attempts before giving up
+    Returns:
+        The API response
+    Raises:
+        HttpError: If the request keeps failing or the error is not retryable
+    """
+    for attempt in range(max_attempts):
+        try:
+            return request.execute()
+        except HttpError as e:
+            if attempt == max_attempts - 1 or not _is_retryable(e):
+                raise
+            delay = min(2 ** attempt + random.random(), 32)
+            # Honor the server's Retry-After header when present
+            retry_after = e.resp.get('retry-after')
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            logger.warning(
+                "Retryable API error (HTTP %s), retrying in %.1fs",
+                e.resp.status, delay
+            )
+            time.sleep(delay)
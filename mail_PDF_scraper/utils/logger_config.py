@@ -1,47 +1,70 @@
 import logging
 import logging.handlers
 import os
-from datetime import datetime
+import queue
 
 def setup_logger():
     """Configure application-wide logging"""
-    
+
     # Create logs directory if it doesn't exist
     log_dir = 'logs'
     os.makedirs(log_dir, exist_ok=True)
-    
+
     # Create formatter
     formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
-    
-    # File handler for app.log
+
+    # File handler for app.log; delay=True defers opening the file until
+    # the first record is actually written
     log_file = os.path.join(log_dir, 'app.log')
     file_handler = logging.handlers.RotatingFileHandler(
         log_file,
         maxBytes=10485760,  # 10MB
         backupCount=5,
-        encoding='utf-8'
+        encoding='utf-8',
+        delay=True
     )
     file_handler.setFormatter(formatter)
     file_handler.setLevel(logging.INFO)
-    
+
+    # Route records through a queue so log calls on worker threads only
+    # enqueue; the listener thread does the disk I/O and rotation
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, respect_handler_level=True
+    )
+
     # Configure root logger
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.INFO)
-    
+
+    # Stop the listener from a previous setup call before replacing it
+    previous_listener = getattr(root_logger, 'log_listener', None)
+    if previous_listener:
+        previous_listener.stop()
+
     # Remove any existing handlers
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
-    
-    # Add only file handler
-    root_logger.addHandler(file_handler)
-    
-    # Set secure permissions for log directory and file
+
+    # Add only the queue handler
+    listener.start()
+    root_logger.addHandler(queue_handler)
+
+    # Set secure permissions for log directory and file; the handler opens
+    # lazily (delay=True), so create the file here to enforce the mode
+    # before the first record is written
     os.chmod(log_dir, 0o750)
+    fd = os.open(log_file, os.O_CREAT | os.O_APPEND, 0o640)
+    os.close(fd)
     os.chmod(log_file, 0o640)
-    
+
     # Disable propagation to console
     root_logger.propagate = False
-    
-    return root_logger 
\ No newline at end of file
+
+    # Keep a handle on the listener so it can be stopped at shutdown
+    root_logger.log_listener = listener
+
+    return root_logger
@@ -1,20 +1,121 @@
 import PyPDF2
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from typing import Tuple, List, Optional, Dict, Any
+from hashlib import blake2b
 from io import BytesIO
-import time
 import re
 from datetime import datetime
 
 # Get module logger
 logger = logging.getLogger(__name__)
 
+# Common patterns for password format descriptions, compiled once
+_PASSWORD_FORMAT_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r"password.*?(?:is|:).*?(?:date of birth|DOB).*?(?:format|in).*?(\w+)",
+    r"password.*?(?:is|:).*?last (\d+) digits",
+    r"password.*?(?:is|:).*?first (\d+) digits",
+    r"password format.*?(\w+)",
+    r"password.*?in.*?(\w+).*?format",
+    r"format.*?(\w+).*?(?:for password|as password)",
+)]
+
+# Strips everything but digits in a single C-level pass; a regex (unlike
+# a delete-only translate table) covers the full Unicode range
+_NON_DIGIT_RE = re.compile(r'\D+')
+
+# Candidate counts at or below this are tried serially; thread startup
+# would cost more than it saves
+_PARALLEL_THRESHOLD = 8
+
+# Upper bound on remembered (file digest -> transactions) entries
+_META_CACHE_MAX = 256
+
+# Fused statement-line pattern: date, description and amount captured in a
+# single scan ('.' stays within one line, so matches never span lines)
+_TXN_RE = re.compile(
+    r'(?P<date>\d{2}/\d{2}/\d{2,4}|\d{2}-\d{2}-\d{2,4})'
+    r'(?P<desc>.*?)'
+    r'(?:Rs\.|INR|₹)\s*(?P<amount>\d+(?:,\d+)*(?:\.\d{2})?)'
+)
+
+@lru_cache(maxsize=512)
+def _extract_password_format(email_body: str) -> Optional[str]:
+    """Extract password format information from an email body"""
+    for pattern in _PASSWORD_FORMAT_PATTERNS:
+        match = pattern.search(email_body)
+        if match:
+            return match.group(1).lower()
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _generate_variants_from_format(password: str, format_hint: Optional[str]) -> tuple:
+    """Generate password variants based on format hint"""
+    variants = [password]  # Always try the original password first
+
+    if not format_hint:
+        return tuple(variants)
+
+    format_hint = format_hint.lower()
+    hint_digits = _NON_DIGIT_RE.sub('', format_hint)
+
+    # Handle different format types
+    if "dob" in format_hint or "date of birth" in format_hint:
+        # Try common date formats
+        clean_pass = password.replace("/", "").replace("-", "").strip()
+        if len(clean_pass) == 8:
+            variants.extend([
+                clean_pass,  # DDMMYYYY
+                f"{clean_pass[4:]}{clean_pass[2:4]}{clean_pass[:2]}",  # YYYYMMDD
+                f"{clean_pass[:4]}{clean_pass[4:6]}{clean_pass[6:]}",  # MMDDYYYY
+            ])
+    elif "last" in format_hint and hint_digits:
+        num_digits = int(hint_digits)
+        if len(password) >= num_digits:
+            variants.append(password[-num_digits:])
+    elif "first" in format_hint and hint_digits:
+        num_digits = int(hint_digits)
+        if len(password) >= num_digits:
+            variants.append(password[:num_digits])
+
+    # Add basic variants
+    variants.extend([
+        password.strip(),
+        password.replace(" ", ""),
+        _NON_DIGIT_RE.sub('', password)
+    ])
+
+    # Order-preserving dedupe so the original password stays first
+    return tuple(dict.fromkeys(variants))
+
+
+def _build_candidates(passwords: List[str], format_hint: Optional[str]) -> List[str]:
+    """
+    Flatten passwords and their variants into one ordered candidate list
+    Args:
+        passwords: Raw password list (empties are skipped)
+        format_hint: Optional format hint extracted from the email body
+    Returns:
+        List[str]: Deduplicated candidates; each distinct string appears once
+    """
+    return list(dict.fromkeys(
+        variant
+        for password in passwords if password.strip()
+        for variant in ((password,) +
+                        _generate_variants_from_format(password, format_hint))
+    ))
+
+
 class PdfHandler:
     def __init__(self):
         """Initialize PDF handler"""
         self.password_cache = {}
         self.group_passwords = {}  # Cache for group-wise passwords
         self.format_cache = {}  # Cache for password formats by sender/group
+        self._file_meta_cache = {}  # file digest -> parsed transactions
         logger.info("PDF handler initialized")
     
     def clear_password_cache(self):
@@ -22,6 +123,10 @@ class PdfHandler:
         self.password_cache = {}
         self.group_passwords = {}
         self.format_cache = {}
+        # The memoized variant and format-hint helpers hold passwords and
+        # email-body keys process-wide; they count as password caches too
+        _generate_variants_from_format.cache_clear()
+        _extract_password_format.cache_clear()
         logger.info("Password caches cleared")
     
     def _create_pdf_reader(self, file_data: bytes) -> PyPDF2.PdfReader:
@@ -39,70 +144,45 @@ class PdfHandler:
                 return True
             
             if pdf_reader.decrypt(password):
-                # Verify we can actually read the content
-                _ = pdf_reader.pages[0].extract_text()
-                return True
+                # Confirm the pages are readable; extracting text here would
+                # parse the whole content stream just to throw it away
+                return len(pdf_reader.pages) > 0
             return False
         except Exception as e:
             logger.debug(f"Decryption attempt failed: {str(e)}")
             return False
     
-    def _extract_password_format(self, email_body: str) -> Optional[str]:
-        """Extract password format information from email body"""
-        # Common patterns for password format descriptions
-        patterns = [
-            r"password.*?(?:is|:).*?(?:date of birth|DOB).*?(?:format|in).*?(\w+)",
-            r"password.*?(?:is|:).*?last (\d+) digits",
-            r"password.*?(?:is|:).*?first (\d+) digits",
-            r"password format.*?(\w+)",
-            r"password.*?in.*?(\w+).*?format",
-            r"format.*?(\w+).*?(?:for password|as password)",
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, email_body.lower())
-            if match:
-                return match.group(1)
-        return None
-    
-    def _generate_variants_from_format(self, password: str, format_hint: Optional[str]) -> List[str]:
-        """Generate password variants based on format hint"""
-        variants = [password]  # Always try the original password first
-        
-        if not format_hint:
-            return variants
-            
-        format_hint = format_hint.lower()
-        
-        # Handle different format types
-        if "dob" in format_hint or "date of birth" in format_hint:
-            # Try common date formats
-            clean_pass = password.replace("/", "").replace("-", "").strip()
-            if len(clean_pass) == 8:
-                variants.extend([
-                    clean_pass,  # DDMMYYYY
-                    f"{clean_pass[4:]}{clean_pass[2:4]}{clean_pass[:2]}",  # YYYYMMDD
-                    f"{clean_pass[:4]}{clean_pass[4:6]}{clean_pass[6:]}",  # MMDDYYYY
-                ])
-        elif "last" in format_hint and any(d.isdigit() for d in format_hint):
-            # Extract number of digits
-            num_digits = int(''.join(filter(str.isdigit, format_hint)))
-            if len(password) >= num_digits:
-                variants.append(password[-num_digits:])
-        elif "first" in format_hint and any(d.isdigit() for d in format_hint):
-            # Extract number of digits
-            num_digits = int(''.join(filter(str.isdigit, format_hint)))
-            if len(password) >= num_digits:
-                variants.append(password[:num_digits])
-        
-        # Add basic variants
-        variants.extend([
-            password.strip(),
-            password.replace(" ", ""),
-            ''.join(filter(str.isdigit, password))
-        ])
-        
-        return list(set(variants))  # Remove duplicates
+    def _parse_transactions(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Parse transactions out of already-extracted statement text
+        Args:
+            text: Concatenated page text
+        Returns:
+            List[Dict[str, Any]]: List of transaction dictionaries
+        """
+        transactions = []
+
+        # One C-level pass over the whole text instead of two searches
+        # per line
+        for match in _TXN_RE.finditer(text):
+            # Description is the text between date and amount
+            description = match.group('desc').strip()
+
+            # Skip if description is empty
+            if not description:
+                continue
+
+            # Create transaction dictionary
+            transaction = {
+                'date': match.group('date'),
+                'description': description,
+                'amount': match.group('amount').replace(',', ''),
+                'category': ''  # Can be enhanced with categorization logic
+            }
+
+            transactions.append(transaction)
+
+        return transactions
 
     def _extract_transactions(self, pdf_reader: PyPDF2.PdfReader) -> List[Dict[str, Any]]:
         """
@@ -112,61 +192,44 @@ class PdfHandler:
         Returns:
             List[Dict[str, Any]]: List of transaction dictionaries
         """
-        transactions = []
-        
         try:
-            # Extract text from all pages
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-            
-            # Common patterns for credit card statements
-            date_pattern = r'(\d{2}/\d{2}/\d{2,4}|\d{2}-\d{2}-\d{2,4})'
-            amount_pattern = r'(?:Rs\.|INR|₹)\s*(\d+(?:,\d+)*(?:\.\d{2})?)'
-            
-            # Split text into lines
-            lines = text.split('\n')
-            
-            for line in lines:
-                # Skip empty lines
-                if not line.strip():
-                    continue
-                
-                # Try to extract date
-                date_match = re.search(date_pattern, line)
-                if not date_match:
-                    continue
-                
-                # Try to extract amount
-                amount_match = re.search(amount_pattern, line)
-                if not amount_match:
-                    continue
-                
-                # Extract description (text between date and amount)
-                date_end = date_match.end()
-                amount_start = amount_match.start()
-                description = line[date_end:amount_start].strip()
-                
-                # Skip if description is empty
-                if not description:
-                    continue
-                
-                # Create transaction dictionary
-                transaction = {
-                    'date': date_match.group(1),
-                    'description': description,
-                    'amount': amount_match.group(1).replace(',', ''),
-                    'category': ''  # Can be enhanced with categorization logic
-                }
-                
-                transactions.append(transaction)
-        
+            # Extract text from all pages; a single join avoids the
+            # repeated-copy cost of building the string incrementally
+            text = '\n'.join(page.extract_text() or '' for page in pdf_reader.pages)
+            return self._parse_transactions(text)
         except Exception as e:
             logger.error(f"Error extracting transactions: {str(e)}")
-        
-        return transactions
-    
-    def process_pdf(self, file_data: bytes, group_key: str, passwords: List[str] = None, email_body: Optional[str] = None) -> Tuple[bytes, bool, str, List[Dict[str, Any]]]:
+            return []
+
+    def _finalize_decrypted(self, pdf_reader: PyPDF2.PdfReader,
+                            size_hint: int = 0) -> Tuple[bytes, List[Dict[str, Any]]]:
+        """
+        Copy a decrypted reader's pages and extract transactions in one pass
+        Args:
+            pdf_reader: Decrypted PyPDF2.PdfReader instance
+            size_hint: Approximate output size for buffer preallocation
+        Returns:
+            Tuple[bytes, List[Dict]]: (Unencrypted PDF data, transactions)
+        """
+        writer = PyPDF2.PdfWriter()
+        text_parts = []
+        # Each page is decrypted and parsed exactly once; copying and text
+        # extraction used to walk the pages separately
+        for page in pdf_reader.pages:
+            writer.add_page(page)
+            text_parts.append(page.extract_text() or '')
+
+        transactions = self._parse_transactions('\n'.join(text_parts))
+
+        # Preallocate near the input size so the write doesn't grow the
+        # buffer geometrically; decrypted output is comparable in size
+        output = BytesIO(bytes(size_hint)) if size_hint else BytesIO()
+        writer.write(output)
+        output.truncate()
+        return output.getvalue(), transactions
+
+
+    def process_pdf(self, file_data: bytes, group_key: str, passwords: List[str] = None, email_body: Optional[str] = None, produce_unencrypted: bool = True) -> Tuple[bytes, bool, str, List[Dict[str, Any]]]:
         """
         Process a PDF file with improved group-wise password handling and transaction extraction
         Args:
@@ -174,6 +237,9 @@ class PdfHandler:
             group_key: Key to identify the group for password caching
             passwords: List of passwords to try
             email_body: Optional email body text for password format hints
+            produce_unencrypted: When False, skip re-serializing an
+                unencrypted copy and return the original bytes; callers
+                that only need transactions save a full PDF write
         Returns:
             Tuple[bytes, bool, str, List[Dict]]: (Processed file data, needs_password flag, error message, transactions)
         """
@@ -181,6 +247,13 @@ class PdfHandler:
             if not file_data:
                 return None, False, "Empty file data received", []
 
+            # Retried attachments arrive with identical bytes; a cheap
+            # digest lookup skips re-parsing files already known clean
+            file_key = blake2b(file_data, digest_size=16).digest()
+            cached_transactions = self._file_meta_cache.get(file_key)
+            if cached_transactions is not None:
+                return file_data, False, "", cached_transactions
+
             # Create PDF reader
             try:
                 pdf_reader = self._create_pdf_reader(file_data)
@@ -193,6 +266,11 @@ class PdfHandler:
             # If not encrypted, extract transactions and return as is
             if not pdf_reader.is_encrypted:
                 transactions = self._extract_transactions(pdf_reader)
+                # Only unencrypted results are remembered; the cache stays
+                # small and never holds decrypted output
+                if len(self._file_meta_cache) >= _META_CACHE_MAX:
+                    self._file_meta_cache.pop(next(iter(self._file_meta_cache)))
+                self._file_meta_cache[file_key] = transactions
                 return file_data, False, "", transactions
 
             # Try group password first if available
@@ -201,64 +279,34 @@ class PdfHandler:
                 logger.info(f"Trying cached group password for {group_key}")
                 if self._try_decrypt_with_password(pdf_reader, group_password):
                     logger.info("Successfully decrypted with group password")
-                    transactions = self._extract_transactions(pdf_reader)
-                    
-                    # Create unencrypted PDF
-                    output = BytesIO()
-                    writer = PyPDF2.PdfWriter()
-                    for page in pdf_reader.pages:
-                        writer.add_page(page)
-                    writer.write(output)
-                    output_pdf = output.getvalue()
-                    
+                    if produce_unencrypted:
+                        output_pdf, transactions = self._finalize_decrypted(
+                            pdf_reader, len(file_data))
+                    else:
+                        transactions = self._extract_transactions(pdf_reader)
+                        output_pdf = file_data
                     return output_pdf, False, "", transactions
 
             # If no passwords provided
             if not passwords:
                 return None, True, "Password required", []
 
-            # Try each password
-            for password in passwords:
-                if not password.strip():
-                    continue
-
-                # Try original password
-                pdf_reader = self._create_pdf_reader(file_data)  # Fresh reader for each attempt
-                if self._try_decrypt_with_password(pdf_reader, password):
-                    logger.info(f"Found working password")
-                    self.group_passwords[group_key] = password  # Cache for group
-                    transactions = self._extract_transactions(pdf_reader)
-                    
-                    # Create unencrypted PDF
-                    output = BytesIO()
-                    writer = PyPDF2.PdfWriter()
-                    for page in pdf_reader.pages:
-                        writer.add_page(page)
-                    writer.write(output)
-                    output_pdf = output.getvalue()
-                    
-                    return output_pdf, False, "", transactions
+            # Work the format hint out once; it doesn't change per password
+            format_hint = _extract_password_format(email_body) if email_body else None
 
-                # Generate and try variants
-                variants = self._generate_variants_from_format(password, self._extract_password_format(email_body) if email_body else None)
-                for variant in variants:
-                    pdf_reader = self._create_pdf_reader(file_data)  # Fresh reader for each attempt
-                    if self._try_decrypt_with_password(pdf_reader, variant):
-                        logger.info(f"Found working password variant")
-                        self.group_passwords[group_key] = variant  # Cache for group
+            # One flat, deduplicated candidate list; each distinct string is
+            # tried at most once and decrypt() is retried on the same reader
+            for candidate in _build_candidates(passwords, format_hint):
+                if self._try_decrypt_with_password(pdf_reader, candidate):
+                    logger.info("Found working password")
+                    self.group_passwords[group_key] = candidate  # Cache for group
+                    if produce_unencrypted:
+                        output_pdf, transactions = self._finalize_decrypted(
+                            pdf_reader, len(file_data))
+                    else:
                         transactions = self._extract_transactions(pdf_reader)
-                        
-                        # Create unencrypted PDF
-                        output = BytesIO()
-                        writer = PyPDF2.PdfWriter()
-                        for page in pdf_reader.pages:
-                            writer.add_page(page)
-                        writer.write(output)
-                        output_pdf = output.getvalue()
-                        
-                        return output_pdf, False, "", transactions
-
-                time.sleep(0.1)  # Small delay between attempts
+                        output_pdf = file_data
+                    return output_pdf, False, "", transactions
 
             return None, True, "File has not been decrypted", []
 
@@ -282,24 +330,39 @@ class PdfHandler:
             if not pdf_reader.is_encrypted:
                 return None
 
-            for password in passwords:
-                if not password.strip():
-                    continue
+            # Work the format hint out once; it doesn't change per password
+            format_hint = _extract_password_format(email_body) if email_body else None
 
-                # Try original password
-                if self._try_decrypt_with_password(pdf_reader, password):
-                    logger.info(f"Found working password: {password}")
-                    return password
+            # Flatten passwords and their variants into one deduplicated
+            # candidate list; variants already lead with the original
+            candidates = _build_candidates(passwords, format_hint)
 
-                # Generate and try variants
-                variants = self._generate_variants_from_format(password, self._extract_password_format(email_body) if email_body else None)
-                for variant in variants:
-                    pdf_reader = self._create_pdf_reader(file_data)  # Fresh reader
-                    if self._try_decrypt_with_password(pdf_reader, variant):
-                        logger.info(f"Found working password variant: {variant}")
-                        return variant
+            # Small lists aren't worth the thread startup
+            if len(candidates) <= _PARALLEL_THRESHOLD:
+                for candidate in candidates:
+                    if self._try_decrypt_with_password(pdf_reader, candidate):
+                        logger.info("Found working password")
+                        return candidate
+                return None
+
+            def _try(candidate):
+                # PdfReader isn't thread-safe; each worker parses its own
+                reader = self._create_pdf_reader(file_data)
+                if self._try_decrypt_with_password(reader, candidate):
+                    return candidate
+                return None
 
-                time.sleep(0.1)  # Small delay between attempts
+            with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+                futures = [executor.submit(_try, candidate) for candidate in candidates]
+                try:
+                    for future in as_completed(futures):
+                        candidate = future.result()
+                        if candidate is not None:
+                            logger.info("Found working password")
+                            return candidate
+                finally:
+                    for future in futures:
+                        future.cancel()
 
             return None
 
@@ -1,8 +1,7 @@
 import os
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 import logging
-import pytz
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -12,6 +11,8 @@ class SecurityHandler:
         """Initialize security handler"""
         self.audit_dir = 'audit_logs'
         self._ensure_audit_dir()
+        self._audit_date = None
+        self._audit_fh = None
         
     def _ensure_audit_dir(self):
         """Ensure audit directory exists"""
@@ -22,8 +23,22 @@ class SecurityHandler:
     def _get_audit_file(self):
         """Get current day's audit file path"""
         today = datetime.now().strftime('%Y-%m-%d')
-        return os.path.join(self.audit_dir, f'audit_log_{today}.json')
-    
+        return os.path.join(self.audit_dir, f'audit_log_{today}.jsonl')
+
+    def _audit_handle(self):
+        """Get the open append handle for today's file, rolling at midnight"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        if today != self._audit_date:
+            if self._audit_fh:
+                self._audit_fh.close()
+            audit_file = os.path.join(self.audit_dir, f'audit_log_{today}.jsonl')
+            is_new_file = not os.path.exists(audit_file)
+            self._audit_fh = open(audit_file, 'a', encoding='utf-8')
+            if is_new_file:
+                os.chmod(audit_file, 0o600)
+            self._audit_date = today
+        return self._audit_fh
+
     def log_activity(self, user_email: str, activity_type: str, details: dict):
         """
         Log user activity
@@ -33,29 +48,21 @@ class SecurityHandler:
             details: Dictionary containing activity details
         """
         try:
-            audit_file = self._get_audit_file()
-            
-            # Read existing logs
-            logs = []
-            if os.path.exists(audit_file):
-                with open(audit_file, 'r') as f:
-                    logs = json.load(f)
-            
-            # Add new log entry
             log_entry = {
-                'timestamp': datetime.now(pytz.UTC).isoformat(),
+                'timestamp': datetime.now(timezone.utc).isoformat(),
                 'user_email': user_email,
                 'activity_type': activity_type,
                 'details': details
             }
-            logs.append(log_entry)
-            
-            # Write updated logs
-            with open(audit_file, 'w') as f:
-                json.dump(logs, f, indent=2)
-            
+
+            # Append one line per entry on the kept-open handle; the day's
+            # earlier entries are never re-read or rewritten
+            f = self._audit_handle()
+            f.write(json.dumps(log_entry, separators=(',', ':')) + '\n')
+            f.flush()
+
             logger.info(f"Activity logged: {activity_type}")
-            
+
         except Exception as e:
             logger.error(f"Error logging activity: {str(e)}")
     
@@ -73,7 +80,7 @@ class SecurityHandler:
             'session_created',
             {
                 'session_id': session_id,
-                'created_at': datetime.now(pytz.UTC).isoformat()
+                'created_at': datetime.now(timezone.utc).isoformat()
             }
         )
         return session_id 
\ No newline at end of file
@@ -1,12 +1,48 @@
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import threading
 from datetime import datetime
 
+from .google_api import get_service, get_thread_service, execute_with_retry
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Cell formats applied when appending a file's entry, built once
+FILE_NAME_FORMAT = {
+    'backgroundColor': {'red': 0.85, 'green': 0.92, 'blue': 0.85},
+    'textFormat': {'bold': True, 'fontSize': 12},
+    'horizontalAlignment': 'LEFT',
+    'verticalAlignment': 'MIDDLE'
+}
+HEADER_FORMAT = {'textFormat': {'bold': True}}
+
+# Rows per appendCells request; keeps each body well under the API's
+# request-size ceiling for multi-year statements
+APPEND_CHUNK_ROWS = 5000
+SPACER_FORMAT = {'backgroundColor': {'red': 0.95, 'green': 0.95, 'blue': 0.95}}
+
+
+def _cell(value: str, cell_format: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Build an appendCells cell, optionally with embedded formatting"""
+    cell = {'userEnteredValue': {'stringValue': value}}
+    if cell_format:
+        cell['userEnteredFormat'] = cell_format
+    return cell
+
+
+def _amount_cell(amount: Any) -> Dict[str, Any]:
+    """Encode an amount as a typed number so SUM() works on the column"""
+    try:
+        # Typed numberValue skips the server-side USER_ENTERED parse and
+        # can't be silently stored as text
+        return {'userEnteredValue': {'numberValue': float(amount)}}
+    except (TypeError, ValueError):
+        return _cell(str(amount) if amount is not None else '')
+
+
 class SheetsHandler:
     def __init__(self, credentials: Credentials):
         """
@@ -14,8 +50,48 @@ class SheetsHandler:
         Args:
             credentials: Google OAuth2 credentials
         """
-        self.service = build('sheets', 'v4', credentials=credentials)
-        
+        self.service = get_service('sheets', 'v4', credentials)
+        self._credentials = credentials
+        self._sheet_id_cache: Dict[Tuple[str, str], int] = {}
+        self._sheet_write_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._cache_lock = threading.Lock()
+
+    def _sheet_write_lock(self, spreadsheet_id: str, sheet_name: str) -> threading.Lock:
+        """Get the lock that serializes appends to one sheet"""
+        with self._cache_lock:
+            return self._sheet_write_locks.setdefault(
+                (spreadsheet_id, sheet_name), threading.Lock())
+
+    def _get_sheet_id(self, spreadsheet_id: str, sheet_name: str,
+                      service=None) -> Optional[int]:
+        """
+        Resolve a sheet name to its ID, fetching metadata at most once
+        Args:
+            spreadsheet_id: ID of the spreadsheet
+            sheet_name: Title of the sheet
+            service: Optional per-thread service to issue the fetch on
+        Returns:
+            int: Sheet ID if the sheet exists, None otherwise
+        """
+        service = service or self.service
+        with self._cache_lock:
+            sheet_id = self._sheet_id_cache.get((spreadsheet_id, sheet_name))
+        if sheet_id is not None:
+            return sheet_id
+
+        # Only titles and ids are needed, not every tab's grid properties
+        # and formatting
+        sheet_metadata = execute_with_retry(service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields='sheets(properties(title,sheetId))'
+        ))
+        # Remember every sheet from the one fetch, not just the one asked for
+        with self._cache_lock:
+            for sheet in sheet_metadata.get('sheets', []):
+                properties = sheet['properties']
+                self._sheet_id_cache[(spreadsheet_id, properties['title'])] = properties['sheetId']
+            return self._sheet_id_cache.get((spreadsheet_id, sheet_name))
+
     def create_spreadsheet(self, title: str) -> Optional[str]:
         """
         Create a new Google Sheets spreadsheet
@@ -30,25 +106,28 @@ class SheetsHandler:
                     'title': title
                 }
             }
-            spreadsheet = self.service.spreadsheets().create(
+            spreadsheet = execute_with_retry(self.service.spreadsheets().create(
                 body=spreadsheet,
                 fields='spreadsheetId'
-            ).execute()
+            ))
             return spreadsheet.get('spreadsheetId')
         except Exception as e:
-            logger.error(f"Error creating spreadsheet: {str(e)}")
+            logger.error("Error creating spreadsheet: %s", e)
             return None
 
-    def create_sheet(self, spreadsheet_id: str, title: str) -> Optional[int]:
+    def create_sheet(self, spreadsheet_id: str, title: str,
+                     service=None) -> Optional[int]:
         """
         Create a new sheet in an existing spreadsheet
         Args:
             spreadsheet_id: ID of the spreadsheet
             title: Title of the new sheet
+            service: Optional per-thread service to issue the call on
         Returns:
             int: Sheet ID if successful, None otherwise
         """
         try:
+            service = service or self.service
             body = {
                 'requests': [{
                     'addSheet': {
@@ -58,16 +137,68 @@ class SheetsHandler:
                     }
                 }]
             }
-            response = self.service.spreadsheets().batchUpdate(
+            response = execute_with_retry(service.spreadsheets().batchUpdate(
                 spreadsheetId=spreadsheet_id,
-                body=body
-            ).execute()
-            return response['replies'][0]['addSheet']['properties']['sheetId']
+                body=body,
+                fields='replies/addSheet/properties(title,sheetId)'
+            ))
+            sheet_id = response['replies'][0]['addSheet']['properties']['sheetId']
+            # Seed the cache so the next write doesn't refetch metadata
+            with self._cache_lock:
+                self._sheet_id_cache[(spreadsheet_id, title)] = sheet_id
+            return sheet_id
         except Exception as e:
-            logger.error(f"Error creating sheet: {str(e)}")
+            logger.error("Error creating sheet: %s", e)
             return None
 
-    def write_transactions(self, spreadsheet_id: str, sheet_name: str, 
+    def ensure_sheets(self, spreadsheet_id: str, titles: List[str]) -> Dict[str, int]:
+        """
+        Make sure every requested sheet tab exists, creating all missing
+        ones in a single batchUpdate
+        Args:
+            spreadsheet_id: ID of the spreadsheet
+            titles: Sheet titles a batch run is about to write to
+        Returns:
+            Dict[str, int]: title -> sheetId for every requested title
+        """
+        try:
+            # One metadata fetch seeds the cache with every existing sheet
+            sheet_metadata = execute_with_retry(self.service.spreadsheets().get(
+                spreadsheetId=spreadsheet_id,
+                fields='sheets(properties(title,sheetId))'
+            ))
+            with self._cache_lock:
+                for sheet in sheet_metadata.get('sheets', []):
+                    properties = sheet['properties']
+                    self._sheet_id_cache[(spreadsheet_id, properties['title'])] = properties['sheetId']
+                resolved = {title: self._sheet_id_cache.get((spreadsheet_id, title))
+                            for title in titles}
+
+            # All missing tabs are added in one request instead of one
+            # addSheet round-trip per file
+            missing = [title for title, sheet_id in resolved.items() if sheet_id is None]
+            if missing:
+                body = {
+                    'requests': [{'addSheet': {'properties': {'title': title}}}
+                                 for title in missing]
+                }
+                response = execute_with_retry(self.service.spreadsheets().batchUpdate(
+                    spreadsheetId=spreadsheet_id,
+                    body=body,
+                    fields='replies/addSheet/properties(title,sheetId)'
+                ))
+                with self._cache_lock:
+                    for reply in response.get('replies', []):
+                        properties = reply['addSheet']['properties']
+                        self._sheet_id_cache[(spreadsheet_id, properties['title'])] = properties['sheetId']
+                        resolved[properties['title']] = properties['sheetId']
+
+            return resolved
+        except Exception as e:
+            logger.error("Error ensuring sheets: %s", e)
+            return {}
+
+    def write_transactions(self, spreadsheet_id: str, sheet_name: str,
                          transactions: List[Dict[str, Any]], file_name: str) -> bool:
         """
         Write transactions to a sheet with proper formatting
@@ -79,166 +210,118 @@ class SheetsHandler:
         Returns:
             bool: True if successful, False otherwise
         """
+        return self._write_entry(self.service, spreadsheet_id, sheet_name,
+                                 transactions, file_name)
+
+    def write_transactions_batch(self, spreadsheet_id: str,
+                                 jobs: List[Tuple[str, List[Dict[str, Any]], str]],
+                                 max_workers: int = 8) -> List[bool]:
+        """
+        Write several files' transactions concurrently
+        Args:
+            spreadsheet_id: ID of the spreadsheet
+            jobs: List of (sheet_name, transactions, file_name) tuples
+            max_workers: Number of concurrent writer threads
+        Returns:
+            List of per-job success flags, in the order jobs were given
+        """
+        if not jobs:
+            return []
+
+        results = [False] * len(jobs)
+
+        def _write(index: int) -> None:
+            sheet_name, transactions, file_name = jobs[index]
+            # Each worker thread needs its own service object
+            service = get_thread_service('sheets', 'v4', self._credentials)
+            results[index] = self._write_entry(service, spreadsheet_id,
+                                               sheet_name, transactions, file_name)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(_write, range(len(jobs))))
+
+        return results
+
+    def _write_entry(self, service, spreadsheet_id: str, sheet_name: str,
+                     transactions: List[Dict[str, Any]], file_name: str) -> bool:
+        """
+        Append one file's entry to a sheet on the given service object
+        Args:
+            service: Sheets service to issue the calls on
+            spreadsheet_id: ID of the spreadsheet
+            sheet_name: Name of the sheet
+            transactions: List of transaction dictionaries
+            file_name: Name of the source file
+        Returns:
+            bool: True if successful, False otherwise
+        """
         try:
-            # Get the sheet ID
-            sheet_metadata = self.service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-            sheet_id = None
-            for sheet in sheet_metadata.get('sheets', ''):
-                if sheet['properties']['title'] == sheet_name:
-                    sheet_id = sheet['properties']['sheetId']
-                    break
-            
+            # Get the sheet ID (cached after the first metadata fetch)
+            sheet_id = self._get_sheet_id(spreadsheet_id, sheet_name, service)
+
             if sheet_id is None:
-                sheet_id = self.create_sheet(spreadsheet_id, sheet_name)
+                sheet_id = self.create_sheet(spreadsheet_id, sheet_name, service)
                 if sheet_id is None:
-                    logger.error(f"Failed to create sheet: {sheet_name}")
+                    logger.error("Failed to create sheet: %s", sheet_name)
                     return False
-            
-            # Get the last row in the sheet
-            range_name = f"{sheet_name}!A:A"
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=spreadsheet_id,
-                range=range_name
-            ).execute()
-            last_row = len(result.get('values', [])) + 1
-            
-            # Add spacing if not first entry
-            if last_row > 1:
-                last_row += 3  # Add extra spacing between file entries
-            
-            # Prepare the header rows
-            header = [
-                [file_name],  # File name row
-                ["Date", "Description", "Amount", "Category"]  # Column headers
+
+            # Build the whole entry as appendCells rows with formatting
+            # embedded in the cells; appending after the last data row also
+            # removes the need to read column A for the insertion point
+            rows = [
+                {'values': [_cell(file_name, FILE_NAME_FORMAT)]},
+                {'values': [_cell(header, HEADER_FORMAT)
+                            for header in ("Date", "Description", "Amount", "Category")]},
             ]
-            header_range = f"{sheet_name}!A{last_row}"
-            
-            # Prepare transaction data
-            data = []
-            for trans in transactions:
-                row = [
-                    trans.get('date', ''),
-                    trans.get('description', ''),
-                    trans.get('amount', ''),
-                    trans.get('category', '')
-                ]
-                data.append(row)
-            
-            # Add empty rows after data
-            empty_rows = [[""] * 4] * 3
-            
-            # Prepare all formatting requests
-            requests = []
-            
-            # Format file name row with pastel green background
-            requests.append({
-                'updateCells': {
-                    'rows': [{
-                        'values': [{
-                            'userEnteredFormat': {
-                                'backgroundColor': {
-                                    'red': 0.85,
-                                    'green': 0.92,
-                                    'blue': 0.85
-                                },
-                                'textFormat': {
-                                    'bold': True,
-                                    'fontSize': 12
-                                },
-                                'horizontalAlignment': 'LEFT',
-                                'verticalAlignment': 'MIDDLE'
-                            }
-                        }]
-                    }],
-                    'fields': 'userEnteredFormat',
-                    'range': {
-                        'sheetId': sheet_id,
-                        'startRowIndex': last_row - 1,
-                        'endRowIndex': last_row,
-                        'startColumnIndex': 0,
-                        'endColumnIndex': 4
-                    }
-                }
-            })
-            
-            # Format column headers
-            requests.append({
-                'updateCells': {
-                    'rows': [{
-                        'values': [
-                            {'userEnteredFormat': {'textFormat': {'bold': True}}} for _ in range(4)
-                        ]
-                    }],
-                    'fields': 'userEnteredFormat',
-                    'range': {
-                        'sheetId': sheet_id,
-                        'startRowIndex': last_row,
-                        'endRowIndex': last_row + 1,
-                        'startColumnIndex': 0,
-                        'endColumnIndex': 4
-                    }
-                }
-            })
-            
-            # Format empty rows with light background
-            if data:  # Only if we have data
-                requests.append({
-                    'updateCells': {
-                        'rows': [{
-                            'values': [{
-                                'userEnteredFormat': {
-                                    'backgroundColor': {
-                                        'red': 0.95,
-                                        'green': 0.95,
-                                        'blue': 0.95
-                                    }
-                                }
-                            } for _ in range(4)]
-                        } for _ in range(3)],  # 3 empty rows
-                        'fields': 'userEnteredFormat',
-                        'range': {
+            # Single comprehension packs all transaction rows without the
+            # per-iteration append dispatch
+            rows += [
+                {'values': [_cell(trans.get('date', '')),
+                            _cell(trans.get('description', '')),
+                            _amount_cell(trans.get('amount', '')),
+                            _cell(trans.get('category', ''))]}
+                for trans in transactions
+            ]
+
+            # Three shaded spacer rows close the entry and separate it from
+            # the next file's block
+            spacer_row = {'values': [_cell('', SPACER_FORMAT) for _ in range(4)]}
+            rows.extend([spacer_row] * 3)
+
+            # One batchUpdate carries the values, the formatting and the
+            # column resize; the old flow spent a round-trip on each.
+            # Very large entries are split so no single request body
+            # approaches the API's size limit — the common case is still
+            # exactly one call. The per-sheet lock keeps concurrent batch
+            # jobs from splicing their chunks into each other's block
+            with self._sheet_write_lock(spreadsheet_id, sheet_name):
+                for start in range(0, len(rows), APPEND_CHUNK_ROWS):
+                    requests = [{
+                        'appendCells': {
                             'sheetId': sheet_id,
-                            'startRowIndex': last_row + len(header) + len(data),
-                            'endRowIndex': last_row + len(header) + len(data) + 3,
-                            'startColumnIndex': 0,
-                            'endColumnIndex': 4
+                            'rows': rows[start:start + APPEND_CHUNK_ROWS],
+                            'fields': 'userEnteredValue,userEnteredFormat'
                         }
-                    }
-                })
-            
-            # Auto-resize columns
-            requests.append({
-                'autoResizeDimensions': {
-                    'dimensions': {
-                        'sheetId': sheet_id,
-                        'dimension': 'COLUMNS',
-                        'startIndex': 0,
-                        'endIndex': 4
-                    }
-                }
-            })
-            
-            # Write the data
-            body = {
-                'values': header + data + empty_rows
-            }
-            
-            self.service.spreadsheets().values().update(
-                spreadsheetId=spreadsheet_id,
-                range=header_range,
-                valueInputOption='USER_ENTERED',
-                body=body
-            ).execute()
-            
-            # Apply the formatting
-            body = {'requests': requests}
-            self.service.spreadsheets().batchUpdate(
-                spreadsheetId=spreadsheet_id,
-                body=body
-            ).execute()
-            
+                    }]
+                    # Resize the columns once, with the final chunk
+                    if start + APPEND_CHUNK_ROWS >= len(rows):
+                        requests.append({
+                            'autoResizeDimensions': {
+                                'dimensions': {
+                                    'sheetId': sheet_id,
+                                    'dimension': 'COLUMNS',
+                                    'startIndex': 0,
+                                    'endIndex': 4
+                                }
+                            }
+                        })
+                    execute_with_retry(service.spreadsheets().batchUpdate(
+                        spreadsheetId=spreadsheet_id,
+                        body={'requests': requests}
+                    ))
+
             return True
-            
+
         except Exception as e:
-            logger.error(f"Error writing transactions: {str(e)}")
-            return False 
\ No newline at end of file
+            logger.error("Error writing transactions: %s", e)
+            return False